@@ -1,21 +1,103 @@
 """Handles Config class in configurations that are specific
 to the MRCNN module."""
 
-import math
+import copy
+import functools
+import json
+import os
+import tempfile
+
 import numpy as np
+import yaml
+
+from tools.config import Config, YAMLLoader
 
-import torch
+# Identifies the last successful init_config call, see _init_key()
+_INIT_KEY = None
 
-from tools.config import Config
+
+@functools.lru_cache(maxsize=100)
+def _parse_yaml(path, mtime_ns, size):
+    """Parses a YAML file. mtime_ns and size are part of the cache key,
+    so the file is parsed again whenever it changes on disk.
+
+    The parsed content is also stored in a JSON sidecar file
+    (<path>.cache.json) along with the mtime and size of the YAML file
+    it was built from. The sidecar is only read while both match exactly.
+    """
+    cache_path = path + '.cache.json'
+    try:
+        with open(cache_path) as stream:
+            cache = json.load(stream)
+        if cache['mtime_ns'] == mtime_ns and cache['size'] == size:
+            return cache['config']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    with open(path) as stream:
+        config_dict = yaml.load(stream, Loader=YAMLLoader)
+    _write_json_cache(cache_path, config_dict, mtime_ns, size)
+    return config_dict
+
+
+def _write_json_cache(cache_path, config_dict, mtime_ns, size):
+    """Atomically writes config_dict to cache_path, stamped with the
+    mtime and size of its YAML file. Failures are ignored, the sidecar is
+    only an optimization."""
+    cache = {'mtime_ns': mtime_ns, 'size': size, 'config': config_dict}
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path),
+                                        suffix='.tmp')
+        with os.fdopen(fd, 'w') as stream:
+            json.dump(cache, stream)
+        os.replace(tmp_path, cache_path)
+    except (OSError, TypeError, ValueError):
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _load_yaml_cached(filename):
+    """Returns the parsed content of a YAML file, parsing it only once
+    per (path, mtime, size). A deep copy is returned so that callers
+    cannot modify the cached dictionary."""
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+    return copy.deepcopy(_parse_yaml(path, stat.st_mtime_ns, stat.st_size))
+
+
+def _init_key(config_fns, cmd_args):
+    """Identifies an init_config call. It changes whenever a configuration
+    file is modified on disk or different command line arguments are used.
+    """
+    paths = tuple(os.path.abspath(filename) for filename
+                  in [Config.DEFAULT_CONFIG_FN] + list(config_fns))
+    stamps = tuple((stat.st_mtime_ns, stat.st_size) for stat
+                   in map(os.stat, paths))
+    args = None if cmd_args is None else (cmd_args.dev, cmd_args.dataset)
+    return paths, stamps, args
 
 
 def init_config(config_fns, cmd_args=None):
     """Loads configurations from YAML files, then create utilitaire
     configurations. Freeze config and display it.
+
+    Calling it again with the same files (unchanged on disk) and the same
+    command line arguments does nothing.
     """
+    global _INIT_KEY  # pylint: disable=W0603
+    init_key = _init_key(config_fns, cmd_args)
+    if init_key == _INIT_KEY:
+        return
+
+    # torch is only needed here, importing it at module level slows down
+    # tools that only read configurations
+    import torch
+
+    Config.unfreeze()
     Config.load_default()
     for filename in config_fns:
-        Config.merge(filename)
+        Config.merge_dict(_load_yaml_cached(filename))
 
     if Config.GPU_COUNT and torch.cuda.device_count() > 0:
         Config.DEVICE_NB = int(Config.DEVICE.split(':')[1])
@@ -36,33 +118,40 @@ def init_config(config_fns, cmd_args=None):
     else:
         Config.TRAINING.BATCH_SIZE = Config.IMAGES_PER_GPU
 
-    # Adjust step size based on batch size
-    # TODO this should not be hardcoded
-    # Config.STEPS_PER_EPOCH = Config.BATCH_SIZE * Config.STEPS_PER_EPOCH
-    Config.TRAINING.STEPS_PER_EPOCH = \
-        ((657 - 25) // Config.IMAGES_PER_GPU)
-    Config.TRAINING.VALIDATION_STEPS = 25 // Config.IMAGES_PER_GPU
+    # Derive steps from dataset sizes when they are given
+    if Config.TRAINING.TRAIN_IMAGES is not None:
+        Config.TRAINING.STEPS_PER_EPOCH = \
+            Config.TRAINING.TRAIN_IMAGES // Config.IMAGES_PER_GPU
+    if Config.TRAINING.VALIDATION_IMAGES is not None:
+        Config.TRAINING.VALIDATION_STEPS = \
+            Config.TRAINING.VALIDATION_IMAGES // Config.IMAGES_PER_GPU
 
-    # Input image size
+    # Input image size, stored as an immutable tuple of ints
     if Config.IMAGE.SHAPE is None:
-        Config.IMAGE.SHAPE = np.array(
-            [Config.IMAGE.MAX_DIM, Config.IMAGE.MAX_DIM, 3])
+        Config.IMAGE.SHAPE = (Config.IMAGE.MAX_DIM, Config.IMAGE.MAX_DIM, 3)
     else:
-        Config.IMAGE.SHAPE = np.array(Config.IMAGE.SHAPE)
-
-    # Compute backbone size from input image size
-    Config.BACKBONE.SHAPES = np.array(
-        [[int(math.ceil(Config.IMAGE.SHAPE[0] / stride)),
-          int(math.ceil(Config.IMAGE.SHAPE[1] / stride))]
-         for stride in Config.BACKBONE.STRIDES])
-
-    Config.RPN.BBOX_STD_DEV_GPU = torch.from_numpy(
-        np.reshape(Config.RPN.BBOX_STD_DEV, [1, 4])
-        ).float().to(Config.DEVICE)
+        Config.IMAGE.SHAPE = tuple(int(dim) for dim in Config.IMAGE.SHAPE)
+
+    # Compute backbone size from input image size, -(-a // b) is an
+    # integer ceil division
+    strides = np.asarray(Config.BACKBONE.STRIDES, dtype=np.int64)
+    image_hw = np.asarray(Config.IMAGE.SHAPE[:2], dtype=np.int64)
+    Config.BACKBONE.SHAPES = -(-image_hw[None, :] // strides[:, None])
+
+    # Keep both a NumPy version (data generator) and a device version
+    # (proposal and detection layers) of the deltas std deviation
+    Config.RPN.BBOX_STD_DEV = np.asarray(Config.RPN.BBOX_STD_DEV,
+                                         dtype=np.float32)
+    Config.RPN.BBOX_STD_DEV_GPU = torch.as_tensor(
+        np.reshape(Config.RPN.BBOX_STD_DEV, [1, 4]),
+        dtype=torch.float32, device=Config.DEVICE)
 
     # this configurations are for speeding up the training
     height, width = Config.IMAGE.SHAPE[:2]
-    Config.RPN.CLIP_WINDOW = np.array([0, 0, height, width]).astype(np.float32)
+    Config.RPN.CLIP_WINDOW = torch.tensor(
+        np.array([0, 0, height, width]),
+        requires_grad=False, dtype=torch.float32,
+        device=Config.DEVICE)
     Config.RPN.NORM = torch.tensor(
         np.array([height, width, height, width]),
         requires_grad=False, dtype=torch.float32,
@@ -70,15 +159,27 @@ def init_config(config_fns, cmd_args=None):
 
     check_config()
     Config.freeze()
-    Config.display()
+    _INIT_KEY = init_key
+
+    # In multi-process launches only the first local process displays it
+    if int(os.environ.get('LOCAL_RANK', '0')) == 0 and Config.VERBOSE:
+        Config.display()
 
 
 def check_config():
     """All configuration checks must be placed here."""
     # Image size must be dividable by 2 multiple times
-    h, w = Config.IMAGE.SHAPE[:2]
-    if h / 2**6 != int(h / 2**6) or w / 2**6 != int(w / 2**6):
+    image_hw = np.asarray(Config.IMAGE.SHAPE[:2], dtype=np.int64)
+    if (image_hw & ((1 << 6) - 1)).any():
         raise Exception("Image size must be divisable by 2 at least "
                         "6 times to avoid fractions when downscaling "
                         "and upscaling. For example, use 256, 320, 384, "
                         "448, 512, ... etc. ")
+    if Config.NMS_BACKEND not in ('cuda', 'torchvision'):
+        raise Exception(f"NMS_BACKEND must be cuda or torchvision, got "
+                        f"{Config.NMS_BACKEND}.")
+    # Every level of the feature pyramid must have a positive size
+    if not (Config.BACKBONE.SHAPES > 0).all():
+        raise Exception(f"Backbone shapes must be positive, got "
+                        f"{Config.BACKBONE.SHAPES.tolist()}. Check "
+                        f"IMAGE.SHAPE and BACKBONE.STRIDES.")
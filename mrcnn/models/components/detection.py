@@ -2,7 +2,7 @@
 import torch
 
 from tools.config import Config
-from mrcnn.models.components.nms import nms_wrapper  # pylint: disable=E0401,E0611
+from mrcnn.models.components.nms import nms
 from mrcnn.utils import utils
 from mrcnn.utils.exceptions import NoBoxToKeep
 
@@ -29,8 +29,7 @@ def _to_input_domain(rois, probs, deltas):
     # Convert coordinates to image domain
     refined_rois = refined_rois * Config.RPN.NORM
     # Clip boxes to image window
-    refined_rois = utils.clip_boxes(
-        refined_rois, Config.RPN.CLIP_WINDOW, squeeze=True)
+    refined_rois = utils.clip_boxes(refined_rois, Config.RPN.CLIP_WINDOW)
 
     return refined_rois, top_class_ids, top_class_probs
 
@@ -50,16 +49,17 @@ def _apply_nms(class_ids, class_probs, refined_rois, keep):
         class_probs, order = class_probs.sort(descending=True)
         class_rois = class_rois[order, :]
 
-        class_keep = nms_wrapper.nms_indexes(
+        class_keep = nms.nms_indexes(
             class_rois.unsqueeze(0),
             class_probs.unsqueeze(0),
             Config.DETECTION.NMS_THRESHOLD,
             class_rois.shape[0]).squeeze(0)
 
         class_keep = class_keep.unique()
-        # Map indices back to keep list
+        # Map indices back to keep list. Both keep and class_keep hold
+        # unique indexes, as required by set_intersection.
         class_keep = keep[class_idxs[order[class_keep]]]
-        keep = utils.set_intersection(keep.unique(), class_keep.unique())
+        keep = utils.set_intersection(keep, class_keep)
 
     return keep
 
@@ -100,8 +100,8 @@ def detection_layer(rois, probs, deltas):
         raise NoBoxToKeep
 
     # Keep top detections
-    _, top_scores_idxs = class_probs[keep].sort(descending=True)[1]
-    top_scores_idxs = top_scores_idxs[:Config.DETECTION.MAX_INSTANCES]
+    nb_top = min(Config.DETECTION.MAX_INSTANCES, keep.shape[0])
+    top_scores_idxs = class_probs[keep].topk(nb_top)[1]
     keep = keep[top_scores_idxs]
 
     # Arrange output as [N, (y1, x1, y2, x2, class_id, score)]
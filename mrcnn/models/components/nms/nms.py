@@ -0,0 +1,38 @@
+"""
+Selects the Non-Maximum Suppression implementation set by
+Config.NMS_BACKEND: cuda (nms_wrapper extension) or torchvision.
+
+Licensed under The MIT License
+"""
+import functools
+import importlib
+
+from tools.config import Config
+
+
+_BACKEND_MODULES = {
+    'cuda': 'mrcnn.models.components.nms.nms_wrapper',
+    'torchvision': 'mrcnn.models.components.nms.torchvision_nms',
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _import_backend(name):
+    return importlib.import_module(_BACKEND_MODULES[name])
+
+
+def _backend():
+    """Returns the module of the configured backend, imported once."""
+    return _import_backend(Config.NMS_BACKEND)
+
+
+def nms_indexes(boxes, scores, threshold, proposal_count):
+    """Returns [batch_size, proposal_count] indexes of boxes kept by NMS.
+    Boxes must be sorted by decreasing score."""
+    return _backend().nms_indexes(boxes, scores, threshold, proposal_count)
+
+
+def nms_wrapper(boxes, scores, threshold, proposal_count):
+    """Returns [batch_size, proposal_count, 4] boxes kept by NMS.
+    Boxes must be sorted by decreasing score."""
+    return _backend().nms_wrapper(boxes, scores, threshold, proposal_count)
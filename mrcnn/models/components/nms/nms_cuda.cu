@@ -18,21 +18,32 @@ int const block_size = sizeof(unsigned long long) * 8;
 extern THCState *state;
 
 /**
- * Computes IoU of two boxes.
+ * Computes the area of a box.
  */
-__device__ inline float compute_iou(float const * const box1,
-                                    float const * const box2) {
-  float left = max(box1[0], box2[0]);
-  float right = min(box1[2], box2[2]);
-  float top = max(box1[1], box2[1]);
-  float bottom = min(box1[3], box2[3]);
-  float width = max(right - left + 1, 0.f);
-  float height = max(bottom - top + 1, 0.f);
+__device__ inline float compute_area(float const * const box) {
+  return (box[2] - box[0] + 1) * (box[3] - box[1] + 1);
+}
+
+/**
+ * Checks if IoU of two boxes, given their areas, is above threshold.
+ * Threshold is positive, so boxes that do not overlap are rejected
+ * before computing the intersection. The test is done as
+ * intersection > threshold * union, without a division.
+ */
+__device__ inline bool iou_above_threshold(float const * const box1,
+                                           float const * const box2,
+                                           const float area1,
+                                           const float area2,
+                                           const float threshold) {
+  float width = min(box1[2], box2[2]) - max(box1[0], box2[0]) + 1;
+  if (width <= 0.f)
+    return false;
+  float height = min(box1[3], box2[3]) - max(box1[1], box2[1]) + 1;
+  if (height <= 0.f)
+    return false;
   float intersection = width * height;
-  float area1 = (box1[2] - box1[0] + 1) * (box1[3] - box1[1] + 1);
-  float area2 = (box2[2] - box2[0] + 1) * (box2[3] - box2[1] + 1);
   float union_ = area1 + area2 - intersection;
-  return intersection/union_;
+  return intersection > threshold * union_;
 }
 
 /**
@@ -63,13 +74,15 @@ __global__ void compute_iou_kernel(
   const int col_size = min(nb_boxes - col_idx*block_size, block_size);
   int img_addr = img_idx*nb_boxes;
 
-  // copy to block shared memory
+  // copy to block shared memory, areas are computed once per box
   __shared__ float block_boxes[block_size*4];
+  __shared__ float block_areas[block_size];
   if (thread_idx < col_size) {
     int block_addr = col_idx*block_size;
     int box_addr = (img_addr + block_addr + thread_idx)*4;
     for (int i=0; i<4; i++)
       block_boxes[thread_idx*4 + i] = dev_boxes[box_addr + i];
+    block_areas[thread_idx] = compute_area(&block_boxes[thread_idx*4]);
   }
   __syncthreads();
 
@@ -77,11 +90,13 @@ __global__ void compute_iou_kernel(
     // compute iou
     int block_addr = img_addr + row_idx*block_size + thread_idx;
     const float *cur_box = &dev_boxes[block_addr*4];
+    const float cur_area = compute_area(cur_box);
     unsigned long long t = 0;
     int start = (row_idx == col_idx) ? thread_idx + 1 : 0;
     for (int i = start; i < col_size; i++) {
       const float *box2 = &block_boxes[i*4];
-      if (compute_iou(cur_box, box2) > threshold)
+      if (iou_above_threshold(cur_box, box2, cur_area, block_areas[i],
+                              threshold))
         t |= 1ULL << i;
     }
     // map rectangular grid back to linear grid
@@ -101,7 +116,7 @@ void compute_nms(
     const int nb_max_proposals,
     const int nb_elements_tri,
     const int nb_boxes,
-    std::vector<unsigned long long>& iou_matrix_host) {
+    const unsigned long long* const iou_matrix_host) {
 
   std::vector<unsigned long long> suppress(nb_col_blocks);
   std::fill(suppress.begin(), suppress.end(), 0);
@@ -114,12 +129,14 @@ void compute_nms(
     if (!(suppress[nblock] & (1ULL << inblock))) {
       keep[thread_idx][num_to_keep++] = i;
       last_index = i;
-      unsigned long long *p = &iou_matrix_host[0] +
-                              thread_idx*nb_elements_tri*block_size +
-                              inblock*nb_elements_tri;
+      // IoU masks of box i against the boxes of each column block
+      const unsigned long long *p = iou_matrix_host +
+                                    thread_idx*nb_elements_tri*block_size +
+                                    inblock*nb_elements_tri +
+                                    nblock*nb_col_blocks;
+      // plain contiguous OR loop, vectorized by the compiler
       for (int j = nblock; j < nb_col_blocks; j++) {
-        int linear_idx = nblock*nb_col_blocks + j%nb_col_blocks;
-        suppress[j] |= p[linear_idx];
+        suppress[j] |= p[j];
       }
       if (num_to_keep == nb_max_proposals)
         break;
@@ -176,22 +193,33 @@ at::Tensor nms_cuda(const at::Tensor& boxes,
 
   unsigned int iou_matrix_size = batch_size*nb_elements_tri*block_size;
   unsigned int iou_matrix_size_bytes = iou_matrix_size*sizeofULL;
-  auto iou_matrix = (unsigned long long*) THCudaMalloc(state, iou_matrix_size_bytes);
+  // Both buffers come from PyTorch's caching allocators, so they are
+  // reused between calls instead of being allocated and freed each time.
+  // The host copy is pinned, so the transfer is a single DMA copy.
+  at::Tensor iou_matrix = at::empty({(int64_t) iou_matrix_size},
+                                    boxes.options().dtype(at::kLong));
+  at::Tensor iou_matrix_host = at::empty({(int64_t) iou_matrix_size},
+                                         iou_matrix.options()
+                                                   .device(at::kCPU)
+                                                   .pinned_memory(true));
+  auto iou_matrix_ptr = (unsigned long long*) iou_matrix.data<int64_t>();
+  auto iou_matrix_host_ptr =
+    (unsigned long long*) iou_matrix_host.data<int64_t>();
 
   dim3 grid_dim(nb_elements_tri, batch_size);
   dim3 block_dim(block_size);
   compute_iou_kernel<<<grid_dim, block_dim>>>(
-    nb_boxes, threshold, boxes.data<float>(), iou_matrix, c_row,
+    nb_boxes, threshold, boxes.data<float>(), iou_matrix_ptr, c_row,
     c_col, nb_col_blocks, nb_elements_tri);
 
-  std::vector<unsigned long long> iou_matrix_host(iou_matrix_size);
-  THCudaCheck(cudaMemcpy(&iou_matrix_host[0], iou_matrix,
+  THCudaCheck(cudaMemcpy(iou_matrix_host_ptr, iou_matrix_ptr,
                          iou_matrix_size_bytes, cudaMemcpyDeviceToHost));
 
-  THCudaFree(state, iou_matrix);
+  // pinned, so the copy of the results back to the device is async
   at::Tensor keep = at::empty({batch_size, nb_max_proposals},
                               boxes.options().dtype(at::kLong)
                                              .device(at::kCPU)
+                                             .pinned_memory(true)
                                              .requires_grad(false));
 
   std::thread threads[batch_size];
@@ -204,11 +232,11 @@ at::Tensor nms_cuda(const at::Tensor& boxes,
       nb_max_proposals,
       nb_elements_tri,
       nb_boxes,
-      std::ref(iou_matrix_host));
+      iou_matrix_host_ptr);
   }
 
   for (auto& thread: threads) {
     thread.join();
   }
-  return keep.to(boxes.device());
+  return keep.to(boxes.options().dtype(at::kLong), /*non_blocking=*/true);
 }
\ No newline at end of file
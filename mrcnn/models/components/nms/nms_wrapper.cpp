@@ -38,18 +38,19 @@ void validate_inputs(at::Tensor boxes,
 }
 
 
+/**
+ * Boxes must be sorted by decreasing score. Callers already get them
+ * in this order (top-k in the proposal layer, sort in the detection
+ * layer), so they are not sorted again here. Returned indexes refer
+ * to the given boxes.
+ */
 at::Tensor nms_indexes(at::Tensor boxes,
                        const at::Tensor scores,
                        const float threshold,
                        const int proposal_count) {
   validate_inputs(boxes, scores, threshold, proposal_count);
 
-  // order boxes by score
-  auto order = std::get<1>(scores.sort(1, true));
-  order = order.unsqueeze(2).expand({-1, -1, 4});
-  auto boxes_sorted = boxes.gather(1, order).contiguous();
-
-  return nms_cuda(boxes_sorted, threshold, proposal_count);
+  return nms_cuda(boxes.contiguous(), threshold, proposal_count);
 }
 
 // CUDA proxy
@@ -0,0 +1,51 @@
+"""
+Non-Maximum Suppression based on torchvision.ops.nms. It has the same
+interface as the CUDA extension (nms_wrapper.cpp) and also runs on CPU.
+Results are the same as long as no two boxes have the same score:
+torchvision.ops.nms sorts boxes by score again (not stably on CUDA),
+while the extension keeps the input order of boxes with equal scores.
+
+Licensed under The MIT License
+"""
+import torch
+import torchvision
+
+
+def nms_indexes(boxes, scores, threshold, proposal_count):
+    """Computes NMS for a batch of boxes.
+
+    Args:
+        boxes: [batch_size, nb_boxes, (y1, x1, y2, x2)] sorted by
+               decreasing score.
+        scores: [batch_size, nb_boxes]
+        threshold: boxes with IoU above it are suppressed.
+        proposal_count: number of indexes returned per image.
+
+    Returns:
+        [batch_size, proposal_count] indexes of kept boxes. If less boxes
+        are kept, the last kept index is repeated. Images without boxes
+        get zero indexes.
+    """
+    # Boxes include their last row and column, as in nms_cuda.cu. IoU is
+    # symmetric in y and x, so coordinates are not swapped.
+    boxes = boxes.clone()
+    boxes[:, :, 2:] += 1
+
+    keeps = []
+    for img_boxes, img_scores in zip(boxes, scores):
+        keep = torchvision.ops.nms(img_boxes, img_scores, threshold)
+        keep = keep[:proposal_count]
+        nb_missing = proposal_count - keep.shape[0]
+        if keep.numel() == 0:
+            keep = keep.new_zeros(proposal_count)
+        elif nb_missing > 0:
+            keep = torch.cat([keep, keep[-1:].expand(nb_missing)])
+        keeps.append(keep)
+    return torch.stack(keeps)
+
+
+def nms_wrapper(boxes, scores, threshold, proposal_count):
+    """Computes NMS for a batch of boxes and returns the kept boxes,
+    [batch_size, proposal_count, 4]. See nms_indexes()."""
+    keep = nms_indexes(boxes, scores, threshold, proposal_count)
+    return boxes.gather(1, keep.unsqueeze(2).expand(-1, -1, 4))
@@ -1,5 +1,5 @@
 
-from mrcnn.models.components.nms import nms_wrapper  # pylint: disable=E0611
+from mrcnn.models.components.nms import nms
 from mrcnn.utils import utils
 from tools.config import Config
 from tools.time_profiling import profilable
@@ -42,8 +42,8 @@ def proposal_layer(scores, deltas, proposal_count, nms_threshold, anchors):
     # Clip to image boundaries. [batch, N, (y1, x1, y2, x2)]
     boxes = utils.clip_boxes(boxes, Config.RPN.CLIP_WINDOW)
 
-    # Non-max suppression
-    boxes = nms_wrapper.nms_wrapper(
+    # Non-max suppression, boxes are already sorted by score (topk)
+    boxes = nms.nms_wrapper(
         boxes,
         scores,
         nms_threshold,
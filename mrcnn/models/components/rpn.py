@@ -54,7 +54,7 @@ class RPN(nn.Module):
         # Reshape to [batch, 2, anchors]
         rpn_class_logits = rpn_class_logits.permute(0, 2, 3, 1)
         rpn_class_logits = rpn_class_logits.contiguous()
-        rpn_class_logits = rpn_class_logits.view(x.size()[0], -1, 2)
+        rpn_class_logits = rpn_class_logits.view(x.shape[0], -1, 2)
 
         # Softmax on last dimension of BG/FG.
         rpn_probs = self.softmax(rpn_class_logits)
@@ -66,6 +66,6 @@ class RPN(nn.Module):
         # Reshape to [batch, 4, anchors]
         rpn_bbox = rpn_bbox.permute(0, 2, 3, 1)
         rpn_bbox = rpn_bbox.contiguous()
-        rpn_bbox = rpn_bbox.view(x.size()[0], -1, 4)
+        rpn_bbox = rpn_bbox.view(x.shape[0], -1, 4)
 
         return [rpn_class_logits, rpn_probs, rpn_bbox]
@@ -27,7 +27,7 @@ from mrcnn.models.components.proposal import proposal_layer
 from mrcnn.models.components.resnet import ResNet
 from mrcnn.models.components.rpn import RPN
 from mrcnn.structs.mrcnn_ground_truth import MRCNNGroundTruth
-from mrcnn.structs.mrcnn_output import MRCNNOutput
+from mrcnn.structs.mrcnn_output import MRCNNOutput, empty_mrcnn_output
 from mrcnn.structs.rpn_output import RPNOutput
 from mrcnn.structs.rpn_target import RPNTarget
 from mrcnn.utils import utils
@@ -149,7 +149,8 @@ class MaskRCNN(nn.Module):
         """
 
         # Mold inputs to format expected by the neural network
-        molded_image, image_metas = utils.mold_inputs([image])
+        molded_image, images_metas = utils.mold_inputs([image])
+        image_metas = images_metas[0]
 
         # Run object detection
         self.eval()
@@ -255,7 +256,7 @@ class MaskRCNN(nn.Module):
                         gt.boxes[img_idx], gt.masks[img_idx])
 
                 if rois.nelement() == 0:
-                    mrcnn_out = MRCNNOutput().to(Config.DEVICE)
+                    mrcnn_out = empty_mrcnn_output(Config.DEVICE)
                     logging.debug('Rois size is empty')
                 else:
                     # Network Heads
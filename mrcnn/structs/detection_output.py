@@ -10,6 +10,8 @@ class DetectionOutput(TensorContainer):
         scores: [N] Float probability scores of the class_id
         masks: [height, width, num_instances] Instance masks
     """
+    __slots__ = ('rois', 'class_ids', 'scores', 'masks')
+
     def __init__(self, rois, class_ids, scores, masks):
         self.rois = rois
         self.class_ids = class_ids
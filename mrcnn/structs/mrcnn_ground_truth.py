@@ -5,6 +5,8 @@ from mrcnn.structs.tensor_container import TensorContainer
 
 
 class MRCNNGroundTruth(TensorContainer):
+    __slots__ = ('class_ids', 'boxes', 'masks')
+
     def __init__(self,
                  class_ids=torch.IntTensor(),
                  boxes=torch.FloatTensor(),
@@ -4,6 +4,8 @@ from mrcnn.structs.tensor_container import TensorContainer
 
 
 class MRCNNOutput(TensorContainer):
+    __slots__ = ('class_logits', 'deltas', 'masks')
+
     def __init__(self,
                  class_logits=torch.FloatTensor(),
                  deltas=torch.FloatTensor(),
@@ -11,3 +13,19 @@ class MRCNNOutput(TensorContainer):
         self.class_logits = class_logits
         self.deltas = deltas
         self.masks = masks
+
+
+# Empty tensors used by empty_mrcnn_output, by device
+_EMPTY_TENSORS = {}
+
+
+def empty_mrcnn_output(device):
+    """Returns an MRCNNOutput without any ROI on device. Its empty tensors
+    are created once per device and shared, they must not be modified in
+    place."""
+    empty_tensors = _EMPTY_TENSORS.get(device)
+    if empty_tensors is None:
+        empty_tensors = tuple(torch.empty(0, device=device)
+                              for _ in MRCNNOutput.__slots__)
+        _EMPTY_TENSORS[device] = empty_tensors
+    return MRCNNOutput(*empty_tensors)
@@ -6,6 +6,8 @@ from tools.config import Config
 
 
 class MRCNNTarget(TensorContainer):
+    __slots__ = ('class_ids', 'deltas', 'masks', '_mask_shape')
+
     def __init__(self,
                  mask_shape,
                  class_ids=torch.IntTensor(),
@@ -5,6 +5,8 @@ from mrcnn.structs.tensor_container import TensorContainer
 
 
 class RPNOutput(TensorContainer):
+    __slots__ = ('class_logits', 'classes', 'deltas')
+
     def __init__(self,
                  class_logits=torch.FloatTensor(),
                  classes=torch.IntTensor(),
@@ -4,6 +4,8 @@ from mrcnn.structs.tensor_container import TensorContainer
 
 
 class RPNTarget(TensorContainer):
+    __slots__ = ('match', 'deltas')
+
     def __init__(self,
                  match=torch.FloatTensor(),
                  deltas=torch.FloatTensor()):
@@ -8,38 +8,44 @@ Written by Jean Da Rolt
 
 
 class TensorContainer():
+    """Base class of tensor containers. Subclasses declare their
+    attributes in __slots__, so instances have no __dict__. Attributes
+    starting with '_' are not tensors and are left untouched.
+    The first slot must be a tensor, its first dimension is the length
+    of the container.
+    """
+    __slots__ = ()
+
+    def _tensor_names(self):
+        return [name for name in self.__slots__ if not name.startswith('_')]
+
     def to(self, device):  # !pylint: disable=C0103
         """Apply pytorch's to() to all tensors in this container."""
-        for key, value in self.__dict__.items():
-            if key.startswith('_'):  # do not change private attributes
-                continue
-            self.__dict__[key] = value.to(device)
+        for name in self._tensor_names():
+            setattr(self, name, getattr(self, name).to(device))
         return self
 
     def cpu(self):
         """Apply pytorch's cpu() to all tensors in this container."""
-        for key, value in self.__dict__.items():
-            self.__dict__[key] = value.cpu()
+        for name in self._tensor_names():
+            setattr(self, name, getattr(self, name).cpu())
         return self
 
     def numpy(self):
         """Apply pytorch's numpy() to all tensors in this container."""
-        for key, value in self.__dict__.items():
-            self.__dict__[key] = value.numpy()
+        for name in self._tensor_names():
+            setattr(self, name, getattr(self, name).numpy())
         return self
 
     def select(self, keep):
         """Apply same indexing to all tensors in container"""
-        for key, value in self.__dict__.items():
-            self.__dict__[key] = value[keep]
+        for name in self._tensor_names():
+            setattr(self, name, getattr(self, name)[keep])
         return self
 
     def __str__(self):
-        to_str = ''
-        for key, tensor in self.__dict__.items():
-            to_str += ' ' + key + ': ' + str(tensor.shape)
-        return to_str
+        return ''.join(f" {name}: {getattr(self, name).shape}"
+                       for name in self._tensor_names())
 
     def __len__(self):
-        for _, tensor in self.__dict__.items():
-            return tensor.shape[0]
+        return getattr(self, self.__slots__[0]).shape[0]
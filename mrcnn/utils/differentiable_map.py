@@ -2,6 +2,12 @@
 This module contains functions used to make MaP differentiable.
 They are not used in the current version.
 """
+import torch
+import torch.nn.functional as F
+
+from mrcnn.utils.utils import (cached_arange, remove_zero_area,
+                               to_img_domain)
+
 
 def unmold_boxes_x(boxes, class_ids, masks, image_shape, window, scores=None):
     """Reformats the detections of one image from the format of the neural
@@ -25,7 +31,12 @@ def unmold_boxes_x(boxes, class_ids, masks, image_shape, window, scores=None):
     class_ids = class_ids.to(torch.long)
 
     image_shape2 = (image_shape[0], image_shape[1])
-    boxes = to_img_domain(boxes, window, image_shape)
+    window = torch.as_tensor(window, dtype=torch.float32,
+                             device=boxes.device)
+    image_hw = torch.as_tensor(image_shape2, dtype=torch.float32,
+                               device=boxes.device)
+    scale = (window[2:] - window[:2]) / image_hw
+    boxes = to_img_domain(boxes, window, scale, image_hw)
 
     boxes, _, masks, _ = remove_zero_area(boxes, class_ids, masks)
     full_masks = unmold_masks_x(masks, boxes, image_shape2)
@@ -57,7 +68,7 @@ def unmold_detections_x(detections, mrcnn_mask, image_shape, window):
     boxes = detections[:N, :4]
     class_ids = detections[:N, 4].to(torch.long)
     scores = detections[:N, 5]
-    masks = mrcnn_mask[torch.arange(N, dtype=torch.long), :, :, class_ids]
+    masks = mrcnn_mask[cached_arange(N, mrcnn_mask.device), :, :, class_ids]
 
     return unmold_boxes_x(boxes, class_ids, masks, image_shape, window)
 
@@ -71,14 +82,18 @@ def unmold_mask_x(mask, bbox, image_shape):
     Returns a binary mask with the same size as the original image.
     """
     # threshold = 0.5
-    y1, x1, y2, x2 = bbox.floor()
-    shape = (y2 - y1, x2 - x1)
+    y1, x1, y2, x2 = [int(coord) for coord in bbox.floor()]
+    return _unmold_mask_x_core(mask, y2 - y1, x2 - x1)
+
 
-    mask = F.interpolate(mask.unsqueeze(0).unsqueeze(0), size=shape,
+@torch.jit.script
+def _unmold_mask_x_core(mask: torch.Tensor, height: int,
+                        width: int) -> torch.Tensor:
+    """Resizes a [h, w] mask to [height, width] and applies a steep
+    sigmoid around 0.5, a differentiable version of thresholding."""
+    mask = F.interpolate(mask.unsqueeze(0).unsqueeze(0), size=[height, width],
                          mode='bilinear', align_corners=True)
-    mask = mask.squeeze(0).squeeze(0)
-    mask = ((mask - 0.5)*100).sigmoid()
-    return mask
+    return ((mask.squeeze(0).squeeze(0) - 0.5)*100).sigmoid()
 
 
 def unmold_masks_x(masks, boxes, image_shape):
@@ -8,6 +8,9 @@ Written by Jean Da Rolt
 """
 import numpy as np
 
+# Length of the array built by ImageMetas.to_numpy()
+META_SIZE = 20
+
 
 class ImageMetas():
     """Stores image metas."""
@@ -36,15 +39,13 @@ class ImageMetas():
             the image came. Useful if training on images from multiple datasets
             where not all classes are present in all datasets.
         """
-        padding_flat = [element for tupl in self.padding for element in tupl]
-        meta = np.array(
-            [self.image_id]                 # size=1
-            + list(self.original_shape)     # size=3
-            + list(self.window)             # size=4 (y1, x1, y2, x2) in image coordinates
-            + list(self.scale)              # size=2 (vertical, horizontal)
-            + list(padding_flat)            # size=6
-            + list(self.crop),              # size=4
-            dtype=np.float32)
+        meta = np.empty(META_SIZE, dtype=np.float32)
+        meta[0] = self.image_id                          # size=1
+        meta[1:4] = self.original_shape                  # size=3
+        meta[4:8] = self.window                          # size=4 (y1, x1, y2, x2) in image coordinates
+        meta[8:10] = self.scale                          # size=2 (vertical, horizontal)
+        meta[10:16] = np.reshape(self.padding, -1)       # size=6
+        meta[16:] = self.crop                            # size=4
         return meta
 
     def __str__(self):
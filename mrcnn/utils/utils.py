@@ -8,13 +8,14 @@ Written by Waleed Abdulla
 """
 
 import math
+import os
 import random
 import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
 
 import numpy as np
-import scipy.misc
 import scipy.ndimage
-import skimage.transform
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
@@ -30,7 +31,9 @@ from tools.config import Config
 ############################################################
 
 
-def apply_box_deltas(boxes, deltas):
+@torch.jit.script
+def apply_box_deltas(boxes: torch.Tensor,
+                     deltas: torch.Tensor) -> torch.Tensor:
     """Applies the given deltas to the given boxes.
 
     Args:
@@ -41,39 +44,34 @@ def apply_box_deltas(boxes, deltas):
         results: [batch_size, N, 4], where each row is [y1, x1, y2, x2]
     """
     # Convert to y, x, h, w
-    height = boxes[:, :, 2] - boxes[:, :, 0]
-    width = boxes[:, :, 3] - boxes[:, :, 1]
-    center_y = boxes[:, :, 0] + 0.5 * height
-    center_x = boxes[:, :, 1] + 0.5 * width
+    height = boxes[..., 2] - boxes[..., 0]
+    width = boxes[..., 3] - boxes[..., 1]
+    center_y = boxes[..., 0] + 0.5 * height
+    center_x = boxes[..., 1] + 0.5 * width
     # Apply deltas
-    center_y = center_y + deltas[:, :, 0] * height
-    center_x = center_x + deltas[:, :, 1] * width
-    height = height * torch.exp(deltas[:, :, 2])
-    width = width * torch.exp(deltas[:, :, 3])
+    center_y = center_y + deltas[..., 0] * height
+    center_x = center_x + deltas[..., 1] * width
+    height = height * torch.exp(deltas[..., 2])
+    width = width * torch.exp(deltas[..., 3])
     # Convert back to y1, x1, y2, x2
     y1 = center_y - 0.5 * height
     x1 = center_x - 0.5 * width
     y2 = y1 + height
     x2 = x1 + width
-    result = torch.stack([y1, x1, y2, x2], dim=2)
+    result = torch.stack([y1, x1, y2, x2], dim=-1)
     return result
 
 
-def clip_boxes(boxes, window, squeeze=False):
+@torch.jit.script
+def clip_boxes(boxes: torch.Tensor, window: torch.Tensor) -> torch.Tensor:
     """
-    boxes: [N, 4] each col is y1, x1, y2, x2
-    window: [4] in the form y1, x1, y2, x2
+    boxes: [..., 4] each row is y1, x1, y2, x2
+    window: [4] tensor in the form y1, x1, y2, x2, in the same device
+            as boxes
     """
-    if squeeze:
-        boxes = boxes.unsqueeze(0)
-    boxes = torch.stack(
-        [boxes[:, :, 0].clamp(float(window[0]), float(window[2])),
-         boxes[:, :, 1].clamp(float(window[1]), float(window[3])),
-         boxes[:, :, 2].clamp(float(window[0]), float(window[2])),
-         boxes[:, :, 3].clamp(float(window[1]), float(window[3]))], 2)
-    if squeeze:
-        boxes = boxes.squeeze(0)
-    return boxes
+    low = window[:2].repeat(2)
+    high = window[2:].repeat(2)
+    return torch.clamp(boxes, min=low, max=high)
 
 
 def extract_bboxes(mask):
@@ -82,24 +80,20 @@ def extract_bboxes(mask):
 
     Returns: bbox array [num_instances, (y1, x1, y2, x2)].
     """
-    boxes = np.zeros([mask.shape[-1], 4], dtype=np.int32)
-    for i in range(mask.shape[-1]):
-        m = mask[:, :, i]
-        # Bounding box.
-        horizontal_indicies = np.where(np.any(m, axis=0))[0]
-        vertical_indicies = np.where(np.any(m, axis=1))[0]
-        if horizontal_indicies.shape[0]:
-            x1, x2 = horizontal_indicies[[0, -1]]
-            y1, y2 = vertical_indicies[[0, -1]]
-            # x2 and y2 should not be part of the box. Increment by 1.
-            x2 = x2 + 1
-            y2 = y2 + 1
-        else:
-            # No mask for this instance. Might happen due to
-            # resizing or cropping. Set bbox to zeros
-            x1, x2, y1, y2 = 0, 0, 0, 0
-        boxes[i] = np.array([y1, x1, y2, x2])
-    return boxes.astype(np.int32)
+    height, width = mask.shape[:2]
+    # Columns [width, N] and rows [height, N] containing mask pixels
+    horizontal = np.any(mask, axis=0)
+    vertical = np.any(mask, axis=1)
+    # First and last (excluded) active column/row of each instance
+    x1 = horizontal.argmax(axis=0)
+    x2 = width - horizontal[::-1].argmax(axis=0)
+    y1 = vertical.argmax(axis=0)
+    y2 = height - vertical[::-1].argmax(axis=0)
+    boxes = np.stack([y1, x1, y2, x2], axis=1).astype(np.int32)
+    # No mask for this instance. Might happen due to
+    # resizing or cropping. Set bbox to zeros
+    boxes[~horizontal.any(axis=0)] = 0
+    return boxes
 
 
 def compute_iou(box, boxes, box_area, boxes_area):
@@ -128,24 +122,51 @@ def compute_overlaps(boxes1, boxes2):
     boxes1, boxes2: [N, (y1, x1, y2, x2)].
 
     For better performance, pass the largest set first and the smaller second.
+
+    Returns a matrix [boxes1 count, boxes2 count] where each cell contains
+    the IoU value. It is the transposed view of a [boxes2 count, boxes1
+    count] array.
     """
+    boxes1 = np.asarray(boxes1)
+    boxes2 = np.asarray(boxes2)
+    y1, x1, y2, x2 = (np.ascontiguousarray(boxes1[:, idx])
+                      for idx in range(4))
     # Areas of anchors and GT boxes
-    area1 = (boxes1[:, 2] - boxes1[:, 0]) * (boxes1[:, 3] - boxes1[:, 1])
+    area1 = (y2 - y1) * (x2 - x1)
     area2 = (boxes2[:, 2] - boxes2[:, 0]) * (boxes2[:, 3] - boxes2[:, 1])
 
-    # Compute overlaps to generate matrix [boxes1 count, boxes2 count]
-    # Each cell contains the IoU value.
-    overlaps = np.zeros((boxes1.shape[0], boxes2.shape[0]))
-    for i in range(overlaps.shape[1]):
-        box2 = boxes2[i]
-        overlaps[:, i] = compute_iou(box2, boxes1, area2[i], area1)
-    return overlaps
+    # One row per box of boxes2, computed with two reused buffers of
+    # boxes1 size. Broadcasting the whole matrix would allocate several
+    # [boxes1 count, boxes2 count] temporaries.
+    overlaps = np.empty((boxes2.shape[0], boxes1.shape[0]))
+    height = np.empty(boxes1.shape[0])
+    width = np.empty(boxes1.shape[0])
+    for row, box2, box2_area in zip(overlaps, boxes2, area2):
+        np.minimum(y2, box2[2], out=height)
+        height -= np.maximum(y1, box2[0])
+        np.maximum(height, 0, out=height)
+        np.minimum(x2, box2[3], out=width)
+        width -= np.maximum(x1, box2[1])
+        np.maximum(width, 0, out=width)
+        intersection = np.multiply(height, width, out=row)
+        # height is reused for the union
+        union = np.add(area1, box2_area, out=height)
+        union -= intersection
+        np.divide(intersection, union, out=row)
+    return overlaps.T
 
 
 def box_refinement(box, gt_box):
     """Compute refinement needed to transform box to gt_box.
     box and gt_box are [N, (y1, x1, y2, x2)]
     """
+    return _box_refinement(box, gt_box, Config.RPN.BBOX_STD_DEV_GPU)
+
+
+@torch.jit.script
+def _box_refinement(box: torch.Tensor, gt_box: torch.Tensor,
+                    std_dev: torch.Tensor) -> torch.Tensor:
+    """Scripted part of box_refinement, deltas are divided by std_dev."""
     height = box[:, 2] - box[:, 0]
     width = box[:, 3] - box[:, 1]
     center_y = box[:, 0] + 0.5 * height
@@ -161,15 +182,22 @@ def box_refinement(box, gt_box):
     dh = torch.log(gt_height / height)
     dw = torch.log(gt_width / width)
 
-    return torch.stack([dy, dx, dh, dw], dim=1) / Config.RPN.BBOX_STD_DEV_GPU
+    return torch.stack([dy, dx, dh, dw], dim=1) / std_dev
 
 
-def subtract_mean(images):
+def subtract_mean(images, out=None):
     """Takes RGB images with 0-255 values and subtraces
     the mean pixel and converts it to float. Expects image
     colors in RGB order.
+
+    out: float32 array with the shape of images where the result is
+         written. Allocated if not given.
     """
-    return images.astype(np.float32) - Config.IMAGE.MEAN_PIXEL
+    if out is None:
+        out = np.empty(images.shape, dtype=np.float32)
+    # Cast and subtraction in a single pass
+    return np.subtract(images, Config.IMAGE.MEAN_PIXEL, out=out,
+                       dtype=np.float32, casting='unsafe')
 
 
 def mold_image(image):
@@ -177,16 +205,21 @@ def mold_image(image):
     the mean pixel and converts it to float. Expects image
     colors in RGB order.
     """
-    molded_image, image_metas = resize_image(
+    molded_image, image_metas = _resize_to_input(image)
+    molded_image = subtract_mean(molded_image)
+
+    return molded_image, image_metas
+
+
+def _resize_to_input(image):
+    """Resizes an image to the input size configured in Config.IMAGE."""
+    return resize_image(
         image,
         min_dim=Config.IMAGE.MIN_DIM,
         max_dim=Config.IMAGE.MAX_DIM,
         min_scale=Config.IMAGE.MIN_SCALE,
         mode=Config.IMAGE.RESIZE_MODE,
         input_shape=Config.IMAGE.SHAPE)
-    molded_image = subtract_mean(molded_image)
-
-    return molded_image, image_metas
 
 
 def mold_inputs(images):
@@ -195,25 +228,47 @@ def mold_inputs(images):
     images: List of image matricies [height,width,depth]. Images can have
         different sizes.
 
-    Returns 3 Numpy matricies:
-    molded_images: [N, h, w, 3]. Images resized and normalized.
-    image_metas: [N, length of meta data]. Details about each image.
-    windows: [N, (y1, x1, y2, x2)]. The portion of the image that has the
-        original image (padding excluded).
+    Returns:
+    molded_images: [N, 3, h, w]. Images resized and normalized.
+    images_metas: List of N ImageMetas, in the order of images.
     """
-    molded_images = []
+    # Resize images to fit the model expected size. Resizing runs mostly
+    # outside of the GIL, so several images are resized in parallel. The
+    # crop mode draws random offsets, it stays on the calling thread so
+    # that results only depend on the random seed.
+    if len(images) > 1 and Config.IMAGE.RESIZE_MODE != 'crop':
+        max_workers = min(len(images), os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            resized_images = list(executor.map(_resize_to_input, images))
+    else:
+        resized_images = [_resize_to_input(image) for image in images]
+
+    # Normalize each image directly into the batch array
+    molded_images = np.empty((len(images),) + resized_images[0][0].shape,
+                             dtype=np.float32)
     images_metas = []
-    # windows = []
-    for image in images:
-        # Resize image to fit the model expected size
-        molded_image, image_metas = mold_image(image)
-        molded_images.append(molded_image)
+    for idx, (image, image_metas) in enumerate(resized_images):
+        subtract_mean(image, out=molded_images[idx])
         images_metas.append(image_metas)
-    # Pack into arrays
-    molded_images = (torch.from_numpy(np.stack(molded_images)).float()
+    molded_images = (torch.from_numpy(molded_images)
                      .permute(0, 3, 1, 2).to(Config.DEVICE))
 
-    return molded_images, image_metas
+    return molded_images, images_metas
+
+
+# torch.arange tensors already built by cached_arange, by (size, device)
+_ARANGE_CACHE = {}
+
+
+def cached_arange(size, device):
+    """Returns torch.arange(size) as a long tensor on device. Tensors are
+    built once and reused, they must not be modified in place."""
+    key = (size, device)
+    arange = _ARANGE_CACHE.get(key)
+    if arange is None:
+        arange = torch.arange(size, dtype=torch.long, device=device)
+        _ARANGE_CACHE[key] = arange
+    return arange
 
 
 def unmold_detections(detections, mrcnn_mask, image_metas):
@@ -234,7 +289,7 @@ def unmold_detections(detections, mrcnn_mask, image_metas):
     boxes = detections[:nb_dets, :4]
     class_ids = detections[:nb_dets, 4].to(torch.long)
     scores = detections[:nb_dets, 5]
-    masks = mrcnn_mask[torch.arange(nb_dets, dtype=torch.long),
+    masks = mrcnn_mask[cached_arange(nb_dets, mrcnn_mask.device),
                        :, :, class_ids]
     final_rois, final_class_ids, final_scores, final_masks = \
         unmold_boxes(boxes, class_ids, masks, image_metas, scores)
@@ -263,7 +318,15 @@ def unmold_boxes(boxes, class_ids, masks, image_metas, scores=None):
     # Extract boxes, class_ids, scores, and class-specific masks
     class_ids = class_ids.to(torch.long)
 
-    boxes = to_img_domain(boxes, image_metas).to(torch.int32)
+    # Window, scale and image size are copied to the device in a single
+    # transfer
+    transform = torch.as_tensor(
+        np.concatenate([image_metas.window,
+                        np.broadcast_to(image_metas.scale, 2),
+                        image_metas.original_shape[:2]]),
+        dtype=torch.float32, device=boxes.device)
+    boxes = to_img_domain(boxes, transform[:4], transform[4:6],
+                          transform[6:]).to(torch.int32)
 
     boxes, class_ids, masks, scores = remove_zero_area(boxes, class_ids,
                                                        masks, scores)
@@ -322,10 +385,7 @@ def resize_image(image, min_dim=None, max_dim=None, min_scale=None,
 
     if mode == 'resize':
         scale = (input_shape[0]/h, input_shape[1]/w)
-        image = skimage.transform.resize(
-            image, input_shape, order=1,
-            mode='constant', preserve_range=True,
-            anti_aliasing=True)
+        image = _resize_bilinear(image, input_shape[:2])
         return image, ImageMetas(original_shape, window,
                                  scale, padding)
 
@@ -346,10 +406,7 @@ def resize_image(image, min_dim=None, max_dim=None, min_scale=None,
 
     # Resize image using bilinear interpolation
     if scale != 1:
-        image = skimage.transform.resize(
-            image, (round(h * scale), round(w * scale)),
-            order=1, mode='constant', preserve_range=True,
-            anti_aliasing=True)
+        image = _resize_bilinear(image, (round(h * scale), round(w * scale)))
 
     # Need padding or cropping?
     h, w = image.shape[:2]
@@ -398,6 +455,33 @@ def resize_image(image, min_dim=None, max_dim=None, min_scale=None,
             ImageMetas(original_shape, window, scale, padding, crop))
 
 
+def _resize_bilinear(image, output_shape):
+    """Resizes a [height, width(, channels)] image to output_shape
+    (height, width) with torch. Returns a float32 array with values in
+    the range of image.
+
+    Shrinking axes are resized first by averaging pixel areas, then
+    growing axes with bilinear interpolation. This is faster than
+    skimage.transform.resize(order=1, mode='constant', anti_aliasing=True),
+    but not identical: upscaled images only match it away from the
+    border (skimage pads with zeros, edge pixels are repeated here), and
+    area averaging is a different anti-aliasing than skimage's Gaussian.
+    """
+    image = np.asarray(image, dtype=np.float32)
+    height, width = int(output_shape[0]), int(output_shape[1])
+    tensor = torch.from_numpy(image)
+    tensor = tensor.reshape(image.shape[:2] + (-1,)).permute(2, 0, 1)
+    tensor = tensor.unsqueeze(0)
+    shrunk_shape = (min(height, image.shape[0]), min(width, image.shape[1]))
+    if shrunk_shape != image.shape[:2]:
+        tensor = F.interpolate(tensor, size=shrunk_shape, mode='area')
+    if shrunk_shape != (height, width):
+        tensor = F.interpolate(tensor, size=(height, width), mode='bilinear',
+                               align_corners=False)
+    resized = tensor.squeeze(0).permute(1, 2, 0).numpy()
+    return resized.reshape((height, width) + image.shape[2:])
+
+
 def resize_mask(mask, scale, padding, crop):
     """Resizes a mask using the given scale and padding.
     Typically, you get the scale and padding from resize_image() to
@@ -425,38 +509,125 @@ def minimize_masks(boxes, masks, mini_shape):
     Mini-masks can then resized back to image scale using expand_masks()
 
     See inspect_data.ipynb notebook for more details.
+
+    Masks are resized with one grid_sample call per bucket of boxes of
+    similar sizes (same power of two above their height and width), see
+    _minimize_crops(). A large box therefore does not make every crop as
+    large.
     """
     mini_shape = tuple(mini_shape)
-    mini_masks = np.zeros(mini_shape + (masks.shape[-1],), dtype=bool)
-    for i in range(masks.shape[-1]):
-        m = masks[:, :, i].astype(bool)
-        y1, x1, y2, x2 = boxes[i][:4]
-        m = m[y1:y2, x1:x2]
-        if m.size == 0:
-            raise Exception("Invalid bounding box with area of zero")
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore")
-            m = skimage.transform.resize(m, mini_shape, order=1,
-                                         mode="constant")
-        mini_masks[:, :, i] = np.around(m).astype(np.bool)
+    nb_masks = masks.shape[-1]
+    boxes = np.asarray(boxes)[:nb_masks, :4].astype(np.int64)
+    heights = boxes[:, 2] - boxes[:, 0]
+    widths = boxes[:, 3] - boxes[:, 1]
+    if np.any(heights <= 0) or np.any(widths <= 0):
+        raise Exception("Invalid bounding box with area of zero")
+    if nb_masks == 0:
+        return np.zeros(mini_shape + (0,), dtype=bool)
+
+    sizes = np.stack([heights, widths], axis=1)
+    _, buckets = np.unique(np.ceil(np.log2(sizes)), axis=0,
+                           return_inverse=True)
+    buckets = buckets.reshape(-1)
+    mini_masks = np.empty(mini_shape + (nb_masks,), dtype=bool)
+    for bucket in range(buckets.max() + 1):
+        ids = np.where(buckets == bucket)[0]
+        mini_masks[:, :, ids] = _minimize_crops(boxes, masks, ids,
+                                                mini_shape)
     return mini_masks
 
 
+def _minimize_crops(boxes, masks, ids, mini_shape):
+    """Resizes the crops of masks[:, :, ids] in boxes[ids] to mini_shape
+    with a single grid_sample call. Crops are zero padded to their largest
+    size and each one is sampled with its own scale. This is a bilinear
+    resize with zero padding at the borders, like skimage's resize with
+    order=1 and mode='constant'. Results differ from skimage for a few
+    pixels whose value is close to 0.5.
+    """
+    boxes = boxes[ids]
+    heights = boxes[:, 2] - boxes[:, 0]
+    widths = boxes[:, 3] - boxes[:, 1]
+    crops = np.zeros((ids.shape[0], heights.max(), widths.max()),
+                     dtype=np.float32)
+    for crop, idx, (y1, x1, y2, x2) in zip(crops, ids, boxes):
+        # Any non zero value is part of the mask, as in uint8 0/255 masks
+        crop[:y2 - y1, :x2 - x1] = masks[y1:y2, x1:x2, idx].astype(bool)
+
+    # Centers of mini mask pixels in each crop, normalized to [-1, 1]
+    # over the padded crop size (grid_sample with align_corners=False)
+    grid_y = ((np.arange(mini_shape[0]) + 0.5) / mini_shape[0] *
+              2 * heights[:, None] / crops.shape[1] - 1)
+    grid_x = ((np.arange(mini_shape[1]) + 0.5) / mini_shape[1] *
+              2 * widths[:, None] / crops.shape[2] - 1)
+    grid = np.stack(np.broadcast_arrays(grid_x[:, None, :],
+                                        grid_y[:, :, None]), axis=-1)
+
+    mini_masks = F.grid_sample(torch.from_numpy(crops).unsqueeze(1),
+                               torch.from_numpy(grid).float(),
+                               mode='bilinear', padding_mode='zeros',
+                               align_corners=False)
+    # Same as rounding values in [0, 1], 0.5 is rounded to 0
+    return (mini_masks.squeeze(1) > 0.5).permute(1, 2, 0).numpy()
+
+
 def expand_mask(bbox, mini_mask, image_shape):
     """Resizes mini masks back to image size. Reverses the change
     of minimize_mask().
 
     See inspect_data.ipynb notebook for more details.
+
+    Masks with the same box size are resized together with bilinear
+    interpolation and thresholded at 0.5. This is the threshold of 128
+    used with scipy's imresize before, which scaled masks to 0-255.
     """
-    mask = np.zeros(image_shape[:2] + (mini_mask.shape[-1],), dtype=bool)
-    for i in range(mask.shape[-1]):
-        m = mini_mask[:, :, i]
-        y1, x1, y2, x2 = bbox[i][:4]
-        h = y2 - y1
-        w = x2 - x1
-        m = scipy.misc.imresize(m.astype(float), (h, w), interp='bilinear')
-        mask[y1:y2, x1:x2, i] = np.where(m >= 128, 1, 0)
-    return mask
+    nb_masks = mini_mask.shape[-1]
+    mask = torch.zeros(tuple(image_shape[:2]) + (nb_masks,),
+                       dtype=torch.uint8)
+    mini_masks = torch.from_numpy(
+        np.ascontiguousarray(mini_mask.transpose(2, 0, 1))).float()
+    boxes = np.asarray(bbox)[:nb_masks, :4].astype(np.int64).tolist()
+    for (height, width), mask_idxs in _group_by_box_size(boxes).items():
+        resized_masks = F.interpolate(
+            mini_masks[mask_idxs].unsqueeze(1), size=(height, width),
+            mode='bilinear', align_corners=False).squeeze(1)
+        _paste_masks(mask, (resized_masks >= 0.5).to(torch.uint8),
+                     boxes, mask_idxs)
+    return mask.numpy().astype(bool)
+
+
+@torch.jit.script
+def _unmold_masks_core(masks: torch.Tensor, height: int, width: int,
+                       threshold: float) -> torch.Tensor:
+    """Resizes [N, h, w] masks to [N, height, width] and binarizes them."""
+    masks = F.interpolate(masks.unsqueeze(1), size=[height, width],
+                          mode='bilinear', align_corners=True)
+    return (masks.squeeze(1) >= threshold).to(torch.uint8)
+
+
+def _group_by_box_size(boxes):
+    """Groups box indexes by box size.
+
+    boxes: list of [y1, x1, y2, x2].
+
+    Returns a dict mapping each (height, width) to the list of indexes
+    of the boxes with that size.
+    """
+    idxs_by_size = {}
+    for idx, (y1, x1, y2, x2) in enumerate(boxes):
+        idxs_by_size.setdefault((y2 - y1, x2 - x1), []).append(idx)
+    return idxs_by_size
+
+
+@torch.jit.script
+def _paste_masks(full_masks: torch.Tensor, masks: torch.Tensor,
+                 boxes: List[List[int]], mask_idxs: List[int]):
+    """Copies each masks[i] to the box boxes[mask_idxs[i]] of channel
+    mask_idxs[i] of full_masks [height, width, N]."""
+    for i in range(len(mask_idxs)):
+        mask_idx = mask_idxs[i]
+        box = boxes[mask_idx]
+        full_masks[box[0]:box[2], box[1]:box[3], mask_idx] = masks[i]
 
 
 def unmold_mask(mask, bbox, image_shape):
@@ -468,77 +639,74 @@ def unmold_mask(mask, bbox, image_shape):
     Returns a binary mask with the same size as the original image.
     """
     threshold = 0.5
-    y1, x1, y2, x2 = bbox
-    shape = (y2 - y1, x2 - x1)
-
-    mask = F.interpolate(mask.unsqueeze(0).unsqueeze(0), size=shape,
-                         mode='bilinear', align_corners=True)
-    mask = mask.squeeze(0).squeeze(0)
-    mask = torch.where(mask >= threshold,
-                       torch.tensor(1, device=Config.DEVICE),
-                       torch.tensor(0, device=Config.DEVICE))
+    y1, x1, y2, x2 = [int(coord) for coord in bbox]
 
     # Put the mask in the right location.
     full_mask = torch.zeros(image_shape[:2], dtype=torch.uint8)
-    full_mask[y1:y2, x1:x2] = mask.to(torch.uint8)
+    full_mask[y1:y2, x1:x2] = _unmold_masks_core(
+        mask.unsqueeze(0), y2 - y1, x2 - x1, threshold)[0]
     return full_mask
 
 
 def unmold_masks(masks, boxes, image_metas):
-    # Resize masks to original image size and set boundary threshold.
-    image_shape = (image_metas.original_shape[0],
-                   image_metas.original_shape[1])
-    nb_masks = masks.shape[0]
-    full_masks = []
-    for i in range(nb_masks):
-        # Convert neural network mask to full size mask
-        full_mask = unmold_mask(masks[i], boxes[i], image_shape)
-        full_masks.append(full_mask)
-    full_masks = torch.stack(full_masks, dim=-1)\
-        if full_masks else torch.empty((0,) + masks.shape[1:3])
-    return full_masks
+    """Converts masks generated by the neural network to full size binary
+    masks. Masks with the same box size are resized together.
+
+    masks: [N, height, width] of type float. Small, typically 28x28 masks.
+    boxes: [N, (y1, x1, y2, x2)]. The boxes to fit the masks in.
+
+    Returns binary masks [height, width, N] with the size of the original
+    image.
+    """
+    threshold = 0.5
+    image_shape = (int(image_metas.original_shape[0]),
+                   int(image_metas.original_shape[1]))
+    full_masks = torch.zeros(image_shape + (masks.shape[0],),
+                             dtype=torch.uint8, device=masks.device)
+
+    boxes = boxes.tolist()
+    for (height, width), mask_idxs in _group_by_box_size(boxes).items():
+        resized_masks = _unmold_masks_core(
+            masks[mask_idxs], height, width, threshold)
+        # Put the masks in the right location.
+        _paste_masks(full_masks, resized_masks, boxes, mask_idxs)
+    return full_masks.cpu()
 
 
 def remove_zero_area(boxes, class_ids, masks, scores=None):
     # Filter out detections with zero area. Often only happens in early
     # stages of training when the network weights are still a bit random.
-    dx, dy = boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]
-    too_small = dx * dy <= 0.0
-    too_short = dx <= 2.0
-    too_thin = dy <= 2.0
-    skip = too_small + too_short + too_thin
-    positive_area = torch.nonzero(skip == 0)
-    if positive_area.nelement() == 0:
+    # Boxes taller and wider than 2 pixels also have a positive area.
+    dy, dx = boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]
+    keep = (dy > 2.0) & (dx > 2.0)
+    if not keep.any():
         raise NoBoxHasPositiveArea
 
-    keep_ix = positive_area[:, 0]
-    if keep_ix.shape[0] != boxes.shape[0]:
-        boxes = boxes[keep_ix]
-        class_ids = class_ids[keep_ix]
-        scores = scores[keep_ix] if scores is not None else None
-        masks = masks[keep_ix]
+    if not keep.all():
+        boxes = boxes[keep]
+        class_ids = class_ids[keep]
+        scores = scores[keep] if scores is not None else None
+        masks = masks[keep]
     return boxes, class_ids, masks, scores
 
 
-def to_img_domain(boxes, image_metas):
-    image_shape = torch.tensor(image_metas.original_shape,
-                               dtype=torch.float32,
-                               device=Config.DEVICE)
-    window = torch.tensor(image_metas.window,
-                          dtype=torch.float32,
-                          device=Config.DEVICE)
-    # Compute shift to translate coordinates to image domain.
-    shifts = torch.tensor([window[0], window[1], window[0], window[1]],
-                          device=Config.DEVICE)
+def to_img_domain(boxes, window, scale, image_shape):
+    """Translates boxes from the molded image to the original image.
 
+    boxes: [N, (y1, x1, y2, x2)] in molded image coordinates.
+    window: [4] tensor (y1, x1, y2, x2) in the same device as boxes. Area
+            of the molded image where the original image is.
+    scale: [2] tensor (vertical, horizontal) in the same device as boxes.
+           Scale used to resize the original image.
+    image_shape: [2] tensor (height, width) in the same device as boxes.
+                 Size of the original image.
+    """
     # Translate bounding boxes to image domain
-    scale = torch.tensor((image_metas.scale[0], image_metas.scale[1],
-                          image_metas.scale[0], image_metas.scale[1]),
-                         device=Config.DEVICE)
-    boxes = ((boxes - shifts) / scale)
-    original_box = (0, 0, image_shape[0], image_shape[1])
-    boxes = clip_boxes(boxes, original_box, squeeze=True)
-    return boxes
+    shifts = window[:2].repeat(2)
+    scales = scale.repeat(2)
+    boxes = (boxes - shifts) / scales
+    original_box = torch.cat([torch.zeros_like(image_shape), image_shape])
+    return clip_boxes(boxes, original_box)
 
 
 def to_mini_mask(rois, boxes):
@@ -561,9 +729,9 @@ def set_intersection(tensor1, tensor2):
     """Intersection of elements present in tensor1 and tensor2.
     Note: it only works if elements are unique in each tensor.
     """
-    aux = torch.cat((tensor1, tensor2), dim=0)
-    aux = aux.sort()[0]
-    return aux[:-1][(aux[1:] == aux[:-1]).detach()]
+    aux, counts = torch.unique(torch.cat((tensor1, tensor2), dim=0),
+                               sorted=True, return_counts=True)
+    return aux[counts > 1]
 
 
 class SamePad2d(nn.Module):
@@ -573,10 +741,19 @@ class SamePad2d(nn.Module):
         super(SamePad2d, self).__init__()
         self.kernel_size = torch.nn.modules.utils._pair(kernel_size)
         self.stride = torch.nn.modules.utils._pair(stride)
+        # Padding only depends on the input size, computed once per size
+        self._paddings = {}
 
     def forward(self, input):
-        in_width = input.size()[2]
-        in_height = input.size()[3]
+        input_size = (input.shape[2], input.shape[3])
+        padding = self._paddings.get(input_size)
+        if padding is None:
+            padding = self._compute_padding(*input_size)
+            self._paddings[input_size] = padding
+        return F.pad(input, padding, 'constant', 0)
+
+    def _compute_padding(self, in_width, in_height):
+        """Returns (left, right, top, bottom) padding for the input size."""
         out_width = math.ceil(float(in_width) / float(self.stride[-1]))
         out_height = math.ceil(float(in_height) / float(self.stride[1]))
         pad_along_width = ((out_width - 1) * self.stride[0] +
@@ -587,8 +764,7 @@ class SamePad2d(nn.Module):
         pad_top = math.floor(pad_along_height / 2)
         pad_right = pad_along_width - pad_left
         pad_bottom = pad_along_height - pad_top
-        return F.pad(input, (pad_left, pad_right, pad_top, pad_bottom),
-                     'constant', 0)
+        return (pad_left, pad_right, pad_top, pad_bottom)
 
     def __repr__(self):
         return self.__class__.__name__
@@ -9,7 +9,7 @@ import sys
 
 import torch
 
-from mrcnn.models.components.nms import nms_wrapper  # pylint: disable=E0611
+from mrcnn.models.components.nms import torchvision_nms
 
 
 logging.basicConfig(stream=sys.stderr, level=logging.INFO)
@@ -22,6 +22,10 @@ DEVICE = 1
 
 
 def nms_test():
+    # The CUDA extension is only imported here, so that the other tests
+    # run where it is not built
+    from mrcnn.models.components.nms import nms_wrapper  # pylint: disable=E0611,C0415
+
     logging.info('Testing NMS...')
     logging.debug('Loading golden truth input and outputs...')
     gt_nms_in = torch.load(NMS_INPUT)
@@ -42,5 +46,40 @@ def nms_test():
     return 1
 
 
+def torchvision_nms_test():
+    logging.info('Testing torchvision NMS...')
+    gt_nms_in = torch.load(NMS_INPUT, map_location='cpu')
+    gt_nms_out = torch.load(NMS_OUTPUT, map_location='cpu')
+
+    scores = gt_nms_in.select(2, 4)
+    boxes = gt_nms_in[:, :, 0:4]
+    nms_out = torchvision_nms.nms_wrapper(boxes, scores, THRESHOLD,
+                                          PROPOSAL_COUNT)
+
+    if torch.equal(nms_out, gt_nms_out):
+        logging.info('torchvision NMS passed.')
+        return 0
+
+    logging.info('torchvision NMS failed!')
+    return 1
+
+
+def torchvision_nms_empty_test():
+    logging.info('Testing torchvision NMS without boxes...')
+    boxes = torch.zeros((2, 0, 4))
+    scores = torch.zeros((2, 0))
+    keep = torchvision_nms.nms_indexes(boxes, scores, THRESHOLD,
+                                       PROPOSAL_COUNT)
+
+    if keep.shape == (2, PROPOSAL_COUNT) and keep.dtype == torch.long:
+        logging.info('torchvision NMS without boxes passed.')
+        return 0
+
+    logging.info('torchvision NMS without boxes failed!')
+    return 1
+
+
 if __name__ == '__main__':
     nms_test()
+    torchvision_nms_test()
+    torchvision_nms_empty_test()
@@ -0,0 +1,118 @@
+"""
+Test for image and mask utilities.
+
+Licensed under the MIT License
+"""
+import logging
+import sys
+
+import numpy as np
+import skimage.transform
+
+from mrcnn.utils import utils
+
+
+logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+
+IMAGE_SHAPE = (256, 320, 3)
+UPSCALE_SHAPES = [(512, 640), (1024, 1280), (256, 320)]
+DOWNSCALE_SHAPES = [(128, 160), (100, 300), (200, 100)]
+# Rows and columns next to the border, where skimage pads with zeros
+UPSCALE_BORDER = 3
+UPSCALE_TOLERANCE = 1e-3
+DOWNSCALE_MEAN_TOLERANCE = 1.
+DOWNSCALE_MAX_TOLERANCE = 3.
+MINI_MASK_SHAPE = (56, 56)
+MASKS_SHAPE = (512, 512)
+NB_MASKS = 100
+# Fraction of mini mask pixels allowed to differ from skimage, for pixels
+# interpolated to values close to 0.5
+MINI_MASK_TOLERANCE = 1e-3
+
+
+def _skimage_resize(image, shape):
+    return skimage.transform.resize(image, shape, order=1, mode='constant',
+                                    preserve_range=True, anti_aliasing=True)
+
+
+def resize_test():
+    logging.info('Testing image resize...')
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, IMAGE_SHAPE).astype(np.uint8)
+
+    # Bilinear upscaling matches skimage away from the border
+    for shape in UPSCALE_SHAPES:
+        resized = utils._resize_bilinear(image, shape)  # pylint: disable=W0212
+        diff = np.abs(resized - _skimage_resize(image, shape))
+        border = UPSCALE_BORDER
+        if (resized.shape != shape + IMAGE_SHAPE[2:] or
+                diff[border:-border, border:-border].max() >
+                UPSCALE_TOLERANCE):
+            logging.info('Image resize failed for shape %s!', shape)
+            return 1
+
+    # Downscaling anti-aliases differently, compare on a smooth image
+    y, x = np.mgrid[0:IMAGE_SHAPE[0], 0:IMAGE_SHAPE[1]]
+    smooth_image = 127 + 60 * np.sin(y / 23) + 60 * np.cos(x / 31)
+    smooth_image = np.repeat(smooth_image[..., None], IMAGE_SHAPE[2], 2)
+    smooth_image = smooth_image.astype(np.uint8)
+    for shape in DOWNSCALE_SHAPES:
+        resized = utils._resize_bilinear(smooth_image, shape)  # pylint: disable=W0212
+        diff = np.abs(resized - _skimage_resize(smooth_image, shape))
+        diff = diff[1:-1, 1:-1]
+        if (resized.shape != shape + IMAGE_SHAPE[2:] or
+                diff.mean() > DOWNSCALE_MEAN_TOLERANCE or
+                diff.max() > DOWNSCALE_MAX_TOLERANCE):
+            logging.info('Image resize failed for shape %s!', shape)
+            return 1
+
+    logging.info('Image resize passed.')
+    return 0
+
+
+def _elliptic_masks(rng):
+    """Returns boxes and matching elliptic masks with varied sizes."""
+    y, x = np.mgrid[0:MASKS_SHAPE[0], 0:MASKS_SHAPE[1]]
+    masks = np.zeros(MASKS_SHAPE + (NB_MASKS,), dtype=bool)
+    boxes = np.zeros((NB_MASKS, 4), dtype=np.int64)
+    for i in range(NB_MASKS):
+        height, width = rng.integers(4, 120, 2) if i else MASKS_SHAPE
+        y1 = rng.integers(0, MASKS_SHAPE[0] - height + 1)
+        x1 = rng.integers(0, MASKS_SHAPE[1] - width + 1)
+        boxes[i] = [y1, x1, y1 + height, x1 + width]
+        masks[:, :, i] = (((y - y1 - height / 2) / (height / 2)) ** 2 +
+                          ((x - x1 - width / 2) / (width / 2)) ** 2) <= 1
+    return boxes, masks
+
+
+def minimize_masks_test():
+    logging.info('Testing mini masks...')
+    rng = np.random.default_rng(0)
+    boxes, masks = _elliptic_masks(rng)
+
+    # Per mask skimage resize, as minimize_masks used to do
+    expected = np.zeros(MINI_MASK_SHAPE + (NB_MASKS,), dtype=bool)
+    for i, (y1, x1, y2, x2) in enumerate(boxes):
+        expected[:, :, i] = np.around(skimage.transform.resize(
+            masks[y1:y2, x1:x2, i].astype(np.float64), MINI_MASK_SHAPE,
+            order=1, mode='constant', anti_aliasing=False))
+
+    mini_masks = utils.minimize_masks(boxes, masks, MINI_MASK_SHAPE)
+    # uint8 masks with 255 for mask pixels give the same mini masks
+    uint8_mini_masks = utils.minimize_masks(
+        boxes, masks.astype(np.uint8) * 255, MINI_MASK_SHAPE)
+
+    if (mini_masks.dtype == bool and
+            mini_masks.shape == expected.shape and
+            np.mean(mini_masks != expected) <= MINI_MASK_TOLERANCE and
+            np.array_equal(uint8_mini_masks, mini_masks)):
+        logging.info('Mini masks passed.')
+        return 0
+
+    logging.info('Mini masks failed!')
+    return 1
+
+
+if __name__ == '__main__':
+    resize_test()
+    minimize_masks_test()
@@ -9,6 +9,12 @@ Written by Jean Da Rolt
 
 import yaml
 
+# Use libyaml's C parser when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as YAMLLoader
+except ImportError:
+    from yaml import SafeLoader as YAMLLoader
+
 
 class MetaConfig(type):
     """Metaclass used to block modifications to Config attributes if the
@@ -41,6 +47,21 @@ class Config(metaclass=MetaConfig):
         """
         pass
 
+    class FrozenConfigNode():  # !pylint: disable=R0903
+        """Read-only version of ConfigNode built by freeze(). Each node
+        gets its own subclass declaring one slot per attribute, so reads
+        do not go through an instance dictionary.
+        """
+        __slots__ = ()
+
+        def __setattr__(self, name, value):
+            raise Exception('Configuration is frozen.')
+
+        def __reduce__(self):
+            # The slotted subclass is built at runtime and cannot be found
+            # by pickle, the node is rebuilt from its attributes instead
+            return _build_frozen_node, (dict(_node_items(self)),)
+
     def __new__(cls, *args, **kwargs):  # !pylint: disable=W0613
         """This class should not be instantiated."""
         raise Exception('Config class is not meant to be instantiated.')
@@ -68,6 +89,18 @@ class Config(metaclass=MetaConfig):
                             'before loading actual configurations')
         cls._load(config_fn)
 
+    @classmethod
+    def merge_dict(cls, config_dict):
+        """Merge an already parsed configuration into this class.
+
+        Args:
+            config_dict: dictionary with the same layout as the YAML files.
+        """
+        if not Config._DEFAULT_LOADED:
+            raise Exception('Default configuration should be loaded '
+                            'before loading actual configurations')
+        cls._build_config_tree(cls, config_dict)
+
     @classmethod
     def to_string(cls):
         """Recursively convert to string."""
@@ -81,13 +114,20 @@ class Config(metaclass=MetaConfig):
     @classmethod
     def freeze(cls):
         """Blocks the configuration so it cannot be modified. Used to prevent
-        changes in the configuration during execution."""
+        changes in the configuration during execution. Nodes of the
+        configuration tree are replaced by FrozenConfigNode objects."""
+        for name, value in list(cls.__dict__.items()):
+            if isinstance(value, Config.ConfigNode):
+                setattr(cls, name, _freeze_node(value))
         cls._FROZEN = True
 
     @classmethod
     def unfreeze(cls):
         """Unblocks the configuration to be changed."""
         cls._FROZEN = False
+        for name, value in list(cls.__dict__.items()):
+            if isinstance(value, Config.FrozenConfigNode):
+                setattr(cls, name, _thaw_node(value))
 
     @classmethod
     def _load(cls, config_fn):
@@ -99,7 +139,7 @@ class Config(metaclass=MetaConfig):
         """
 
         with open(config_fn) as stream:
-            config_dict = yaml.safe_load(stream)
+            config_dict = yaml.load(stream, Loader=YAMLLoader)
 
         cls._build_config_tree(cls, config_dict)
 
@@ -139,20 +179,59 @@ class Config(metaclass=MetaConfig):
             yaml.dump(_to_dict(), output_file)
 
 
+def _freeze_node(node):
+    """Recursively converts a ConfigNode into a FrozenConfigNode."""
+    attributes = {}
+    for name, value in vars(node).items():
+        if isinstance(value, Config.ConfigNode):
+            value = _freeze_node(value)
+        attributes[name] = value
+    return _build_frozen_node(attributes)
+
+
+def _build_frozen_node(attributes):
+    """Returns a FrozenConfigNode holding the given attributes, a dict of
+    names to values. Values are stored as they are."""
+    frozen_class = type('FrozenConfigNode', (Config.FrozenConfigNode,),
+                        {'__slots__': tuple(attributes)})
+    frozen_node = frozen_class()
+    for name, value in attributes.items():
+        object.__setattr__(frozen_node, name, value)
+    return frozen_node
+
+
+def _thaw_node(frozen_node):
+    """Recursively converts a FrozenConfigNode back to a ConfigNode."""
+    node = Config.ConfigNode()
+    for name, value in _node_items(frozen_node):
+        if isinstance(value, Config.FrozenConfigNode):
+            value = _thaw_node(value)
+        setattr(node, name, value)
+    return node
+
+
+def _node_items(node):
+    """Returns (name, value) pairs of the attributes stored in node."""
+    if isinstance(node, Config.FrozenConfigNode):
+        return [(name, getattr(node, name)) for name in type(node).__slots__]
+    return list(node.__dict__.items())
+
+
 def _to_dict(dict_node={}, node=Config):
-    if type(node).__name__ not in ['MetaConfig', 'ConfigNode']:
+    if not isinstance(node, (MetaConfig, Config.ConfigNode,
+                             Config.FrozenConfigNode)):
         if isinstance(node, (dict, list)):
             return node
         return str(node).rstrip()
 
-    for child_name, child in node.__dict__.items():
-        if child_name == 'ConfigNode':
+    for child_name, child in _node_items(node):
+        if child_name in ['ConfigNode', 'FrozenConfigNode']:
             continue
         if child_name.startswith('_'):
             continue
-        if isinstance(node.__dict__[child_name], classmethod):
+        if isinstance(child, classmethod):
             continue
-        if isinstance(node.__dict__[child_name], staticmethod):
+        if isinstance(child, staticmethod):
             continue
         dict_node[child_name] = _to_dict({}, child)
 